@@ -0,0 +1,51 @@
+from functools import lru_cache
+from agents import Agent, function_tool
+from clients import get_model
+
+# Agent definitions only: crypto.py imports this module too, so the terminal
+# loop and its optional dependencies live in cli.py.
+
+
+# ---------- Crypto agent ----------
+CRYPTO_AGENT_INSTRUCTIONS = """You must use the provided tools to fetch live crypto prices.
+                When user asks price for symbol like BTCUSDT, call get_crypto_price(symbols=...)
+                Tools return JSON; answer with the prices from it, formatted for the user
+                (e.g. BTCUSDT (Binance): $67,012.50). You can reply in any user language.
+            """
+
+def make_crypto_agent(tools, api_key=None):
+    """
+    Builds the crypto agent around the given price tools.
+    Not lru_cached: the tools live in crypto.py (FunctionTool is unhashable),
+    so the caller keeps the singleton (crypto.py uses st.cache_resource).
+    """
+    return Agent(
+        name="Crypto Smart Agent",
+        instructions=CRYPTO_AGENT_INSTRUCTIONS,
+        model=get_model(api_key),
+        tools=list(tools),
+    )
+
+
+# ---------- Tool agent ----------
+@lru_cache(maxsize=1)
+def make_tool_agent():
+    # tools are built here rather than at import, so importing this module
+    # for the crypto agent doesn't pay for their schemas
+    @function_tool
+    def get_weather(city: str) -> str:
+        return f"The weather in {city} is sunny"
+
+    @function_tool
+    def get_date_time():
+        # imported here: the tool is rarely called, so startup doesn't pay for it
+        import datetime
+        return datetime.date.today()
+
+    return Agent(
+        name="Haiku agent",
+        # instructions="Always respond in haiku form",
+        instructions="You are an helpfull assistant",
+        model=get_model(),
+        tools=[get_weather, get_date_time],
+    )
@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+import sys
+import threading
+from agents import Runner
+from clients import get_run_config
+
+# optional: async prompt so the next question can be typed while a reply is in flight
+try:
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.patch_stdout import patch_stdout
+    PROMPT_TOOLKIT_AVAILABLE = True
+except Exception:
+    PROMPT_TOOLKIT_AVAILABLE = False
+
+# optional: libuv-based event loop (not available on Windows)
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except Exception:
+    UVLOOP_AVAILABLE = False
+
+
+# ---------- REPL ----------
+async def _answer(agent, user_input, gate):
+    # the gate is a Semaphore(1): runs go out one at a time, in the order typed
+    async with gate:
+        try:
+            result = await Runner.run(agent, user_input, run_config=get_run_config())
+        except Exception as e:
+            print(f"Error: {e}")
+            return
+    print(result.final_output)
+
+def _resolve(fut, line, exc):
+    if fut.done():
+        return
+    if exc is not None:
+        fut.set_exception(exc)
+    else:
+        fut.set_result(line)
+
+_STDIN = None
+
+def _read_line(prompt):
+    """
+    Reads a line on a daemon thread, resolved into a future on the running
+    loop. Unlike asyncio.to_thread, a pending read doesn't hold up the default
+    executor's shutdown when the loop exits (e.g. after Ctrl-C). It reads from
+    its own handle on stdin rather than input(): a daemon thread blocked
+    inside sys.stdin would abort interpreter shutdown on its buffer lock.
+    """
+    global _STDIN
+    if _STDIN is None:
+        _STDIN = open(sys.stdin.fileno(), "r", encoding=sys.stdin.encoding, closefd=False)
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+
+    def _worker():
+        print(prompt, end="", flush=True)
+        try:
+            line = _STDIN.readline()
+            exc = None if line else EOFError()
+            line = line.rstrip("\r\n")
+        except Exception as e:
+            line, exc = None, e
+        try:
+            loop.call_soon_threadsafe(_resolve, fut, line, exc)
+        except RuntimeError:
+            # loop already closed: nobody is waiting for this line
+            pass
+
+    threading.Thread(target=_worker, name="repl-input", daemon=True).start()
+    return fut
+
+async def repl(agent):
+    """
+    Terminal chat loop for agent until "quit" (or Ctrl-D / Ctrl-C).
+    """
+    session = PromptSession() if PROMPT_TOOLKIT_AVAILABLE else None
+    gate = asyncio.Semaphore(1)
+    pending = set()
+    # patch_stdout keeps replies printed mid-typing from clobbering the prompt
+    with patch_stdout() if PROMPT_TOOLKIT_AVAILABLE else contextlib.nullcontext():
+        while True:
+            try:
+                if session:
+                    user_input = await session.prompt_async("You: ")
+                else:
+                    # read in a worker thread so the event loop keeps running meanwhile
+                    user_input = await _read_line("You: ")
+            except (EOFError, KeyboardInterrupt):
+                break
+            except asyncio.CancelledError:
+                # Ctrl-C under asyncio.run cancels this task rather than
+                # raising KeyboardInterrupt; stop reading, but still wait
+                # for replies in flight below
+                asyncio.current_task().uncancel()
+                break
+            if user_input.lower() == "quit":
+                break
+            task = asyncio.create_task(_answer(agent, user_input, gate))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        # let replies already asked for finish before exiting
+        if pending:
+            await asyncio.gather(*pending)
+
+def run_repl(agent):
+    """Runs repl(agent) on uvloop when it's installed."""
+    asyncio.run(repl(agent), loop_factory=uvloop.new_event_loop if UVLOOP_AVAILABLE else None)
@@ -0,0 +1,41 @@
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+from agents import AsyncOpenAI, OpenAIChatCompletionsModel
+from agents.run import RunConfig
+
+# Load the environment variables from the .env file (once, at import)
+load_dotenv()
+
+#Reference: https://ai.google.dev/gemini-api/docs/openai
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+GEMINI_MODEL = "gemini-2.0-flash"
+
+
+def _resolve_key(api_key=None):
+    key = api_key or os.getenv("GEMINI_API_KEY")
+    # Check if the API key is present; if not, raise an error
+    if not key:
+        raise ValueError("GEMINI_API_KEY is not set. Please ensure it is defined in your .env file.")
+    return key
+
+
+# One client/model/config per process: every agent that imports these shares
+# the same AsyncOpenAI keep-alive pool instead of opening its own.
+@lru_cache(maxsize=1)
+def get_client(api_key=None):
+    return AsyncOpenAI(api_key=_resolve_key(api_key), base_url=GEMINI_BASE_URL)
+
+
+@lru_cache(maxsize=1)
+def get_model(api_key=None):
+    return OpenAIChatCompletionsModel(model=GEMINI_MODEL, openai_client=get_client(api_key))
+
+
+@lru_cache(maxsize=1)
+def get_run_config(api_key=None):
+    return RunConfig(
+        model=get_model(api_key),
+        model_provider=get_client(api_key),
+        tracing_disabled=True
+    )
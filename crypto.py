@@ -11,15 +11,24 @@ Updated Streamlit app:
 import os
 import asyncio
 import threading
-import tempfile
 import time
-from dotenv import load_dotenv
+import atexit
+import queue
+import re
+import uuid
+import difflib
+import operator
+import wave
+from collections import OrderedDict
+from pathlib import Path
 
 import httpx
 import streamlit as st
 import hashlib
+import orjson
 from io import BytesIO
 from gtts import gTTS
+from cachetools import TTLCache
 import base64
 import traceback
 import streamlit.components.v1 as components
@@ -31,16 +40,51 @@ try:
 except Exception:
     AUDIO_RECORDER_AVAILABLE = False
 
-# speech recognition
+# local neural TTS (optional); gTTS is used when it's missing
+try:
+    from piper.voice import PiperVoice
+    PIPER_AVAILABLE = True
+except Exception:
+    PIPER_AVAILABLE = False
+
+# speech recognition: local faster-whisper (optional), Google STT otherwise
+try:
+    from faster_whisper import WhisperModel
+    WHISPER_AVAILABLE = True
+except Exception:
+    WHISPER_AVAILABLE = False
+
 import speech_recognition as sr
 
+# live Binance ticker stream (optional); REST only when it's missing
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except Exception:
+    WEBSOCKETS_AVAILABLE = False
+
+# fast non-cryptographic hash for audio dedup (optional)
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except Exception:
+    XXHASH_AVAILABLE = False
+
+# libuv-based event loop for AGENT_LOOP (optional; not on Windows)
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except Exception:
+    UVLOOP_AVAILABLE = False
+
 # agents package
-from agents import Agent, Runner, AsyncOpenAI, OpenAIChatCompletionsModel, function_tool
-from agents.run import RunConfig
+from agents import Runner, function_tool
+from clients import get_run_config
+from agent_factory import make_crypto_agent
+from openai.types.responses import ResponseTextDeltaEvent
 
 # ---------- load env / secrets ----------
-load_dotenv()
-
+# .env is loaded once by clients.py at import
 def get_gemini_key():
     k = os.getenv("GEMINI_API_KEY")
     if k:
@@ -61,219 +105,826 @@ if not GEMINI_API_KEY:
     )
     st.stop()
 
-# ---------- Setup Gemini client & model ----------
-external_client = AsyncOpenAI(
-    api_key=GEMINI_API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-)
+# ---------- Background event loop ----------
+# All agent work runs on one long-lived loop in a daemon thread, so HTTP
+# connection pools, DNS and TLS session state survive between turns.
+# st.cache_resource keeps a single loop per process across Streamlit reruns.
+@st.cache_resource
+def _background_loop():
+    loop = uvloop.new_event_loop() if UVLOOP_AVAILABLE else asyncio.new_event_loop()
+    # run_forever() makes it the running loop in that thread; no
+    # set_event_loop() needed
+    threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+    return loop
+
+AGENT_LOOP = _background_loop()
+
+def submit_async(coro):
+    """Schedules coro on AGENT_LOOP and returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, AGENT_LOOP)
+
+
+# ---------- Shared HTTP client ----------
+# Both tools share one pooled HTTP/2 client so tool calls reuse warm
+# connections instead of paying a new TCP + TLS handshake each time. Its
+# connections live on AGENT_LOOP, so it is closed there on shutdown.
+# Requests in flight are capped (pool size and semaphore alike) so a long
+# symbol list can't trip the exchanges' rate limits (HTTP 429).
+_MAX_CONCURRENT_REQUESTS = 20
+
+@st.cache_resource
+def _http_client():
+    client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(10.0),
+        limits=httpx.Limits(
+            max_connections=_MAX_CONCURRENT_REQUESTS,
+            max_keepalive_connections=_MAX_CONCURRENT_REQUESTS,
+        ),
+    )
 
-model = OpenAIChatCompletionsModel(
-    model="gemini-2.0-flash",
-    openai_client=external_client
-)
+    def _close():
+        try:
+            asyncio.run_coroutine_threadsafe(client.aclose(), AGENT_LOOP).result(timeout=2)
+        except Exception:
+            pass
 
-config = RunConfig(model=model, model_provider=external_client, tracing_disabled=True)
+    atexit.register(_close)
+    return client
+
+_HTTP = _http_client()
+
+@st.cache_resource
+def _http_gate():
+    return asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+
+_HTTP_GATE = _http_gate()
+
+async def http_get(url, **kwargs) -> httpx.Response:
+    """GET on the shared client, waiting for a free slot under the cap."""
+    async with _HTTP_GATE:
+        return await _HTTP.get(url, **kwargs)
+
+
+# ---------- Live Binance tickers ----------
+# One long-lived websocket receives Binance's all-market mini-ticker stream
+# (about once a second) and keeps the latest close price per symbol, so most
+# Binance price questions need no request at all. Prices are only trusted
+# while frames keep arriving. The stream only carries symbols that changed,
+# so each price also has its own timestamp: a halted or delisted pair stops
+# appearing and its last price ages out instead of being served forever.
+_TICKER_STREAM_URL = "wss://stream.binance.com:9443/ws/!miniTicker@arr"
+_TICKER_MAX_AGE = 5.0
+_TICKER_SYMBOL_MAX_AGE = 30.0
+_TICKER_RETRY_MIN = 5.0
+_TICKER_RETRY_MAX = 300.0
+
+@st.cache_resource
+def _live_tickers():
+    state = {"prices": {}, "ts": 0.0}
+    if not WEBSOCKETS_AVAILABLE:
+        return state
+
+    async def _stream():
+        # reconnect delay doubles while the stream keeps failing (so an
+        # outage doesn't flood the log) and resets once frames arrive again
+        delay = _TICKER_RETRY_MIN
+        while True:
+            try:
+                async with websockets.connect(_TICKER_STREAM_URL) as ws:
+                    async for frame in ws:
+                        prices = state["prices"]
+                        now = time.monotonic()
+                        for t in orjson.loads(frame):
+                            prices[t["s"]] = (float(t["c"]), now)
+                        state["ts"] = now
+                        delay = _TICKER_RETRY_MIN
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Binance ticker stream dropped, reconnecting in {delay:.0f}s:", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _TICKER_RETRY_MAX)
 
+    task = submit_async(_stream())
+    atexit.register(task.cancel)
+    return state
+
+_LIVE_TICKERS = _live_tickers()
+
+def live_binance_price(symbol: str):
+    """
+    Latest streamed Binance price, or None if unknown, not TRADING (once the
+    symbol set is loaded), or if the stream or the symbol's last update is stale.
+    """
+    now = time.monotonic()
+    if now - _LIVE_TICKERS["ts"] > _TICKER_MAX_AGE:
+        return None
+    known = _EXINFO_CACHE["symbols"]
+    if known is not None and symbol not in known:
+        return None
+    entry = _LIVE_TICKERS["prices"].get(symbol)
+    if entry is None or now - entry[1] > _TICKER_SYMBOL_MAX_AGE:
+        return None
+    return entry[0]
 
 
 # ---------- MULTI-EXCHANGE PRICE FETCHER ----------
+# Prices seen in the last couple of seconds are reused, so repeated questions
+# about the same coin are answered from memory instead of the network.
+_PRICE_TTL = 2.0
+
+@st.cache_resource
+def _price_cache():
+    # symbol -> (exchange, price); only touched from AGENT_LOOP
+    return TTLCache(maxsize=1024, ttl=_PRICE_TTL)
+
+# per-symbol fallback chain, tried in order
+_PRICE_EXCHANGES = (
+    ("Binance", "https://api.binance.com/api/v3/ticker/price?symbol={}"),
+    ("Coinbase", "https://api.coinbase.com/v2/prices/{}-USD/spot"),
+    ("Kraken", "https://api.kraken.com/0/public/Ticker?pair={}"),
+)
+# parsed once rather than on every batch request
+_BINANCE_PRICE_URL = httpx.URL("https://api.binance.com/api/v3/ticker/price")
+
 @function_tool
 async def get_crypto_price(symbols: str) -> str:
     """
     Get crypto prices from Binance, Coinbase, and Kraken.
     If one API fails, it tries the next available.
+    Returns compact JSON: {"prices": {symbol: {"exchange", "price"}}, "errors": {symbol: reason}}.
     """
-    exchanges = [
-        ("Binance", "https://api.binance.com/api/v3/ticker/price?symbol={}"),
-        ("Coinbase", "https://api.coinbase.com/v2/prices/{}-USD/spot"),
-        ("Kraken", "https://api.kraken.com/0/public/Ticker?pair={}"),
-    ]
-
-    symbol_list = [s.strip().upper() for s in symbols.split(",")]
-    results = []
-
-    async with httpx.AsyncClient() as client:
-        for symbol in symbol_list:
-            price_found = False
-            for name, base_url in exchanges:
-                try:
-                    url = base_url.format(symbol)
-                    resp = await client.get(url, timeout=10.0)
-                    data = resp.json()
-
-                    # Binance format
-                    if name == "Binance" and resp.status_code == 200 and "price" in data:
-                        price = float(data["price"])
-                        results.append(f"{symbol} ({name}): ${price:,.8f}")
-                        price_found = True
-                        break
-
-                    # Coinbase format
-                    elif name == "Coinbase" and "data" in data and "amount" in data["data"]:
-                        price = float(data["data"]["amount"])
-                        results.append(f"{symbol} ({name}): ${price:,.8f}")
-                        price_found = True
-                        break
-
-                    # Kraken format
-                    elif name == "Kraken" and "result" in data and len(data["result"]) > 0:
-                        first_key = list(data["result"].keys())[0]
-                        price = float(data["result"][first_key]["c"][0])
-                        results.append(f"{symbol} ({name}): ${price:,.8f}")
-                        price_found = True
-                        break
-
-                except Exception:
-                    continue
-
-            if not price_found:
-                results.append(f"{symbol}: ❌ Not found on any exchange")
-
-    return "Prices:\n" + "\n".join(results)
+    exchanges = _PRICE_EXCHANGES
+
+    # drop blanks and repeats ("BTC,,BTC, ETH"), keeping the user's order
+    symbol_list = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+
+    async def _one(symbol, chain):
+        for name, base_url in chain:
+            # a network error, bad status or unexpected payload from one
+            # exchange just moves on to the next one
+            try:
+                resp = await http_get(base_url.format(symbol))
+                data = orjson.loads(resp.content)
+            except (httpx.HTTPError, ValueError):
+                continue
+            if resp.status_code != 200 or not isinstance(data, dict):
+                continue
+
+            try:
+                # Binance format
+                if name == "Binance" and "price" in data:
+                    return name, float(data["price"])
+
+                # Coinbase format
+                elif name == "Coinbase" and "amount" in data.get("data", {}):
+                    return name, float(data["data"]["amount"])
+
+                # Kraken format
+                elif name == "Kraken" and data.get("result"):
+                    first_key = next(iter(data["result"]))
+                    return name, float(data["result"][first_key]["c"][0])
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+
+        return None
+
+    price_cache = _price_cache()
+
+    # symbol -> (exchange, price) for everything priced so far
+    # one get() per symbol: an entry can expire between "in" and [] lookups
+    found = {}
+    for s in symbol_list:
+        cached = price_cache.get(s)
+        if cached is not None:
+            found[s] = cached
+        else:
+            live = live_binance_price(s)
+            if live is not None:
+                found[s] = ("Binance", live)
+    to_fetch = [s for s in symbol_list if s not in found]
+
+    # Symbols Binance doesn't list can't be priced there, so they skip
+    # Binance entirely: no wasted request, and they can't make Binance reject
+    # the batch below. Until the symbol set is loaded, every symbol is tried.
+    known = binance_symbols()
+    if known is None:
+        on_binance = to_fetch
+    else:
+        on_binance = [s for s in to_fetch if s in known]
+
+    # Binance returns every requested price in one call. A single unknown
+    # symbol makes it reject the whole batch (400), so only then do we pay
+    # for per-symbol lookups across all exchanges.
+    binance_done = False
+    if on_binance:
+        # a lone symbol uses the plain ?symbol= form, which returns one object
+        if len(on_binance) == 1:
+            params = {"symbol": on_binance[0]}
+        else:
+            params = {"symbols": orjson.dumps(on_binance).decode()}
+        try:
+            resp = await http_get(_BINANCE_PRICE_URL, params=params)
+            data = orjson.loads(resp.content) if resp.status_code == 200 else None
+            # for a lone symbol that request is exactly what _one() would
+            # send again, so a 4xx answer is final for Binance
+            if len(on_binance) == 1 and 400 <= resp.status_code < 500:
+                binance_done = True
+        except (httpx.HTTPError, ValueError):
+            data = None
+        if data is not None:
+            if isinstance(data, dict):
+                data = [data]
+            # parse everything before recording anything: an unexpected
+            # shape leaves binance_done False and the per-symbol fallback
+            # (Binance included) takes over
+            try:
+                batch = [(d["symbol"], float(d["price"])) for d in data]
+            except (KeyError, TypeError, ValueError):
+                batch = None
+            if batch is not None:
+                for sym, price in batch:
+                    found[sym] = price_cache[sym] = ("Binance", price)
+                binance_done = True
+
+    # symbols Binance already priced are done; the rest only need the
+    # non-Binance exchanges unless Binance itself still has to be asked
+    missing = [s for s in to_fetch if s not in found]
+    # anything _one() still raises is reported for that symbol alone,
+    # so the other symbols' prices are still returned
+    responses = await asyncio.gather(
+        *[
+            _one(s, exchanges if s in on_binance and not binance_done else exchanges[1:])
+            for s in missing
+        ],
+        return_exceptions=True,
+    )
+    failures = {}
+    for symbol, res in zip(missing, responses):
+        if isinstance(res, tuple):
+            found[symbol] = price_cache[symbol] = res
+        else:
+            failures[symbol] = res
+
+    # raw numbers rather than a formatted table: the model formats the reply
+    # itself, and compact JSON costs it fewer tokens to read
+    prices = {}
+    errors = {}
+    for symbol in symbol_list:
+        if symbol in found:
+            name, price = found[symbol]
+            prices[symbol] = {"exchange": name, "price": price}
+            continue
+        res = failures[symbol]
+        if isinstance(res, Exception):
+            errors[symbol] = f"Error - {str(res)}"
+            continue
+        close = difflib.get_close_matches(symbol, known, n=1) if known else []
+        hint = f" (did you mean {close[0]}?)" if close else ""
+        errors[symbol] = f"Not found on any exchange{hint}"
+
+    out = {"prices": prices}
+    if errors:
+        out["errors"] = errors
+    return orjson.dumps(out).decode()
 
 
 # ---------- MULTI-EXCHANGE SYMBOL LIST ----------
-@function_tool
-async def list_all_symbols() -> str:
+# Trading-pair lists change on the order of days, so keep the tool output for a
+# while. The cache dict comes from st.cache_resource because Streamlit
+# re-executes this module on every rerun, which would reset a plain global.
+_EXINFO_TTL = 600
+
+@st.cache_resource
+def _exchange_info_cache():
+    return {
+        "ts": 0.0,
+        "value": None,
+        "lock": asyncio.Lock(),
+        # frozenset of Binance TRADING symbols, kept from the last good fetch
+        "symbols": None,
+        "warmup": None,
+    }
+
+_EXINFO_CACHE = _exchange_info_cache()
+_SYMBOL_STATUS = operator.itemgetter("symbol", "status")
+
+def binance_symbols():
     """
-    Lists available trading pairs from Binance, Coinbase, and Kraken.
+    Returns the Binance TRADING symbols, or None if they aren't loaded yet.
+    A miss, or a set older than the symbol-list TTL, starts (re)loading them
+    in the background (must be called on AGENT_LOOP); the caller gets the
+    current set right away rather than waiting for exchangeInfo.
     """
-    urls = {
-        "Binance": "https://api.binance.com/api/v3/exchangeInfo",
-        "Coinbase": "https://api.coinbase.com/v2/currencies",
-        "Kraken": "https://api.kraken.com/0/public/AssetPairs",
-    }
+    if _cached_symbol_list() is None:
+        warm_symbol_list()
+    return _EXINFO_CACHE["symbols"]
 
-    results = []
+def warm_symbol_list():
+    """
+    Starts fetch_symbol_list() in the background unless it is already running
+    (must be called on AGENT_LOOP). The task is kept in the cache dict so it
+    isn't garbage-collected mid-flight.
+    """
+    warmup = _EXINFO_CACHE["warmup"]
+    if warmup is None or warmup.done():
+        _EXINFO_CACHE["warmup"] = asyncio.create_task(fetch_symbol_list())
 
-    async with httpx.AsyncClient() as client:
-        # Binance
-        try:
-            resp = await client.get(urls["Binance"], timeout=10.0)
-            data = resp.json()
-            symbols = [s["symbol"] for s in data["symbols"] if s["status"] == "TRADING"]
-            results.append(f"Binance: {len(symbols)} pairs (e.g., {', '.join(symbols[:10])})")
-        except Exception as e:
-            results.append(f"Binance: ❌ Error - {str(e)}")
+def _cached_symbol_list():
+    if _EXINFO_CACHE["value"] and time.monotonic() - _EXINFO_CACHE["ts"] < _EXINFO_TTL:
+        return _EXINFO_CACHE["value"]
+    return None
 
-        # Coinbase
-        try:
-            resp = await client.get(urls["Coinbase"], timeout=10.0)
-            data = resp.json()
+async def fetch_symbol_list() -> str:
+    """
+    Returns the list_all_symbols summary as compact JSON
+    ({exchange: {"total", "sample"}}), from cache when it's fresh.
+    Plain coroutine so it can also be used to warm the cache.
+    """
+    cached = _cached_symbol_list()
+    if cached:
+        return cached
+
+    # single-flight: concurrent misses wait for the first fetch instead of
+    # all downloading exchangeInfo at once
+    async with _EXINFO_CACHE["lock"]:
+        cached = _cached_symbol_list()
+        if cached:
+            return cached
+
+        urls = {
+            "Binance": "https://api.binance.com/api/v3/exchangeInfo",
+            "Coinbase": "https://api.coinbase.com/v2/currencies",
+            "Kraken": "https://api.kraken.com/0/public/AssetPairs",
+        }
+
+        async def _binance():
+            # Let Binance drop the bulk at the source: no per-symbol
+            # permissionSets arrays, and only TRADING symbols.
+            resp = await http_get(
+                urls["Binance"],
+                params={"showPermissionSets": "false", "symbolStatus": "TRADING"},
+            )
+            data = orjson.loads(resp.content)
+            # itemgetter does both key lookups in C, once per entry
+            symbols = [sym for sym, status in map(_SYMBOL_STATUS, data["symbols"]) if status == "TRADING"]
+            _EXINFO_CACHE["symbols"] = frozenset(symbols)
+            return {"total": len(symbols), "sample": symbols[:10]}
+
+        async def _coinbase():
+            resp = await http_get(urls["Coinbase"])
+            data = orjson.loads(resp.content)
             currencies = [c["id"] for c in data["data"]]
-            results.append(f"Coinbase: {len(currencies)} assets (e.g., {', '.join(currencies[:10])})")
-        except Exception as e:
-            results.append(f"Coinbase: ❌ Error - {str(e)}")
+            return {"total": len(currencies), "sample": currencies[:10]}
 
-        # Kraken
-        try:
-            resp = await client.get(urls["Kraken"], timeout=10.0)
-            data = resp.json()
+        async def _kraken():
+            resp = await http_get(urls["Kraken"])
+            data = orjson.loads(resp.content)
             pairs = list(data["result"].keys())
-            results.append(f"Kraken: {len(pairs)} pairs (e.g., {', '.join(pairs[:10])})")
-        except Exception as e:
-            results.append(f"Kraken: ❌ Error - {str(e)}")
+            return {"total": len(pairs), "sample": pairs[:10]}
+
+        # the exchanges are independent, so fetch them concurrently
+        summaries = await asyncio.gather(_binance(), _coinbase(), _kraken(), return_exceptions=True)
+
+        results = {}
+        failed = False
+        for name, summary in zip(urls, summaries):
+            if isinstance(summary, Exception):
+                failed = True
+                results[name] = {"error": str(summary)}
+            else:
+                results[name] = summary
+
+        value = orjson.dumps(results).decode()
+        # don't pin an error message in the cache for ten minutes
+        if not failed:
+            _EXINFO_CACHE.update(ts=time.monotonic(), value=value)
+        return value
+
+@function_tool
+async def list_all_symbols() -> str:
+    """
+    Lists available trading pairs from Binance, Coinbase, and Kraken.
+    """
+    return await fetch_symbol_list()
 
-    return "\n".join(results)
 
+# ---------- Gemini client, model & Agent ----------
+# Built once per process: Streamlit re-executes this module on every rerun.
+# The agent definition is shared via agent_factory.py; the AsyncOpenAI
+# client/model/config come from clients.py as process-wide singletons.
+@st.cache_resource
+def get_agent():
+    agent = make_crypto_agent([get_crypto_price, list_all_symbols], GEMINI_API_KEY)
+    config = get_run_config(GEMINI_API_KEY)
+    return agent, config
 
-# ---------- Agent ----------
-agent = Agent(
-    name="Crypto Smart Agent",
-    instructions=(
-        """You must use the provided tools to fetch live crypto prices.
-            When user asks price for symbol like BTCUSDT, call get_crypto_price(symbols=...) 
-            and return only tool output. You can reply in any user language.
-        """
-        
-    ),
-    model=model,
-    tools=[get_crypto_price, list_all_symbols],
-)
+agent, config = get_agent()
 
 # ---------- Utilities ----------
 _SESSION_LOCK = threading.Lock()
 
+# rolling window for the conversation: past _HISTORY_MAX entries, keep the
+# first few and the most recent ones, with a marker for what was dropped
+_HISTORY_MAX = 40
+_HISTORY_HEAD = 2
+_HISTORY_TAIL = 30
+
+def render_turn(role: str, text: str) -> str:
+    if role == "You":
+        return f"**You:** {text}"
+    if role == "System":
+        return f"_{text}_"
+    return f"**Agent:** {text}"
+
 def append_history(role: str, text: str):
     with _SESSION_LOCK:
         if "history" not in st.session_state:
             st.session_state.history = []
-        st.session_state.history.append((role, text))
+        history = st.session_state.history
+        history.append((role, text))
+
+        if len(history) > _HISTORY_MAX:
+            middle = history[_HISTORY_HEAD:-_HISTORY_TAIL]
+            elided = st.session_state.get("history_elided", 0)
+            elided += sum(1 for who, _ in middle if who != "System")
+            st.session_state.history_elided = elided
+            st.session_state.history = (
+                history[:_HISTORY_HEAD]
+                + [("System", f"[{elided} messages elided]")]
+                + history[-_HISTORY_TAIL:]
+            )
+
+# sentence boundaries for streamed speech; "." must be followed by whitespace
+# so prices like $67,000.12 are not cut in half
+_SENTENCE_END = re.compile(r"(?<=[.?!؟])\s+|(?<=。)")
+
+# Agent runs in flight, keyed by a hash of the input and shared by all
+# sessions, so an identical submission (double click, rerun, second tab)
+# waits for the running call instead of paying for another LLM round trip.
+@st.cache_resource
+def _inflight_runs():
+    return {}, threading.Lock()
+
+def run_agent_sync(user_input: str, on_sentence=None) -> str:
+    """
+    Runs the agent on AGENT_LOOP and returns its reply.
+    The reply is streamed: each finished sentence is passed to on_sentence on
+    the calling (script) thread while the model is still generating the rest.
+    If the same input is already being answered, this waits for that run
+    instead (without on_sentence calls).
+    """
+    sentences = queue.Queue()
 
-def run_agent_sync(user_input: str) -> str:
     async def _call():
-        result = await Runner.run(agent, user_input, run_config=config)
-        for item in reversed(result.new_items):
-            try:
-                return item.raw_item.content[0].text
-            except Exception:
-                continue
-        return "Sorry, no response."
+        result = Runner.run_streamed(agent, user_input, run_config=config)
+        pending = ""
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                *finished, pending = _SENTENCE_END.split(pending + event.data.delta)
+                for sentence in finished:
+                    if sentence.strip():
+                        sentences.put(sentence)
+        if pending.strip():
+            sentences.put(pending)
+
+        return result.final_output or "Sorry, no response."
+
+    key = hashlib.blake2b(user_input.encode("utf-8"), digest_size=16).hexdigest()
+    inflight, lock = _inflight_runs()
+    with lock:
+        shared = inflight.get(key)
+        if shared is not None:
+            shared["waiters"] += 1
+        else:
+            entry = {"fut": submit_async(_call()), "waiters": 0}
+            inflight[key] = entry
+
+    if shared is not None:
+        try:
+            return shared["fut"].result()
+        finally:
+            with lock:
+                shared["waiters"] -= 1
 
-    loop = asyncio.new_event_loop()
+    fut = entry["fut"]
+
+    def _done(_):
+        # wake the consumer below, whether the run succeeded or not
+        sentences.put(None)
+        with lock:
+            if inflight.get(key) is entry:
+                del inflight[key]
+
+    fut.add_done_callback(_done)
     try:
-        asyncio.set_event_loop(loop)
-        response = loop.run_until_complete(_call())
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                break
+            if on_sentence is not None:
+                on_sentence(sentence)
+        return fut.result()
+    except BaseException:
+        # e.g. the script thread being stopped by a Streamlit rerun:
+        # don't leave the agent run going on the background loop, unless
+        # another submission is waiting for its answer
+        with lock:
+            waited_on = entry["waiters"] > 0
+        if not waited_on:
+            fut.cancel()
+        raise
+
+def stream_reply(user_input: str) -> str:
+    """
+    Shows the agent's reply as it streams in and speaks it sentence by
+    sentence, so the first sentence plays while the rest is still generated.
+    """
+    live = st.empty()
+    spoken = []
+
+    def _on_sentence(sentence):
+        spoken.append(sentence)
+        live.markdown(f"**Agent:** {' '.join(spoken)}")
+        speak_text_background(sentence, delay=0.12 if len(spoken) == 1 else 0)
+
+    # TTS warm-up runs in the background while the model is thinking
+    prewarm_tts()
+    try:
+        with st.spinner("Agent is thinking..."):
+            response = run_agent_sync(user_input, on_sentence=_on_sentence)
     finally:
-        try:
-            loop.run_until_complete(loop.shutdown_asyncgens())
-        except Exception:
-            pass
-        loop.close()
+        # the finished reply is shown in the conversation below
+        live.empty()
+    # nothing streamed (answer shared with an identical in-flight run)
+    if not spoken:
+        speak_text_background(response, delay=0.12)
     return response
 
+# Piper voice model (.onnx with its .onnx.json next to it)
+PIPER_VOICE_PATH = os.getenv("PIPER_VOICE", "en_US-amy-low.onnx")
+
+@st.cache_resource
+def _piper_voice():
+    """Loads the Piper voice once per process; None if Piper can't be used."""
+    if not PIPER_AVAILABLE:
+        return None
+    try:
+        return PiperVoice.load(PIPER_VOICE_PATH)
+    except Exception as e:
+        print("Piper voice not loaded, using gTTS:", e)
+        return None
+
+@st.cache_resource
+def _tts_warm_state():
+    return {"started": False}
+
+def prewarm_tts():
+    """
+    Starts one throwaway Piper synthesis on AGENT_LOOP's thread pool (once per
+    process), so onnxruntime's first-inference setup overlaps with the agent
+    call instead of delaying the first spoken sentence.
+    """
+    state = _tts_warm_state()
+    voice = _piper_voice()
+    if voice is None or state["started"]:
+        return
+    state["started"] = True
+
+    def _warm():
+        try:
+            for _ in voice.synthesize("Hello."):
+                pass
+        except Exception as e:
+            print("TTS warm-up failed:", e)
+
+    submit_async(asyncio.to_thread(_warm))
+
+def synthesize_speech(text: str, lang: str = "en"):
+    """
+    Returns (audio_bytes, mime). Uses the local Piper voice for English,
+    which avoids the network round trip to Google; other languages, a
+    missing voice model or a failed Piper synthesis go through gTTS.
+    """
+    voice = _piper_voice() if lang == "en" else None
+    if voice is not None:
+        try:
+            buf = BytesIO()
+            with wave.open(buf, "wb") as wf:
+                # piper-tts >= 1.3: sets the WAV format from the first chunk
+                voice.synthesize_wav(text, wf)
+            return buf.getvalue(), "audio/wav"
+        except Exception as e:
+            print("Piper synthesis failed, using gTTS:", e)
+
+    # generate mp3 into BytesIO
+    tts = gTTS(text=text, lang=lang)
+    buf = BytesIO()
+    tts.write_to_fp(buf)
+    return buf.getvalue(), "audio/mp3"
+
+# ---------- TTS cache ----------
+# Identical replies are common (error strings, "Sorry, no response.", repeated
+# price lines), so synthesized audio is kept by engine + text hash: a small
+# in-memory LRU plus files on disk that survive restarts. The disk copy is
+# capped too (least recently used files go first), and text with digits in
+# it is kept in memory only: live prices make those sentences one-offs.
+TTS_CACHE_DIR = Path.home() / ".cache" / "crypto_agent_tts"
+_TTS_CACHE_MAX = 64
+_TTS_DISK_MAX = 512
+_HAS_DIGIT = re.compile(r"\d")
+_TTS_EXTENSIONS = {"audio/wav": ".wav", "audio/mp3": ".mp3"}
+
+@st.cache_resource
+def _tts_cache():
+    return OrderedDict(), threading.Lock()
+
+def _read_cached_speech(key: str):
+    for mime, ext in _TTS_EXTENSIONS.items():
+        path = TTS_CACHE_DIR / f"{key}{ext}"
+        if path.exists():
+            try:
+                audio = path.read_bytes()
+                # mtime doubles as "last used" for pruning
+                path.touch()
+                return audio, mime
+            except OSError:
+                pass
+    return None
+
+def _prune_speech_cache():
+    try:
+        files = sorted(TTS_CACHE_DIR.iterdir(), key=lambda p: p.stat().st_mtime)
+        for path in files[:-_TTS_DISK_MAX]:
+            path.unlink(missing_ok=True)
+    except OSError as e:
+        print("TTS cache prune failed:", e)
+
+def _write_cached_speech(key: str, audio_bytes: bytes, mime: str):
+    try:
+        TTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        (TTS_CACHE_DIR / f"{key}{_TTS_EXTENSIONS[mime]}").write_bytes(audio_bytes)
+    except OSError as e:
+        print("TTS cache write failed:", e)
+        return
+    _prune_speech_cache()
+
+def _tts_engine(lang: str) -> str:
+    """Which engine synthesize_speech() will use; part of the cache key."""
+    if lang == "en" and _piper_voice() is not None:
+        return f"piper:{PIPER_VOICE_PATH}"
+    return "gtts"
+
+def cached_speech(text: str, lang: str = "en"):
+    """synthesize_speech() with the memory + disk cache in front of it."""
+    engine = _tts_engine(lang)
+    key = hashlib.blake2b(f"{engine}:{lang}:{text}".encode("utf-8"), digest_size=16).hexdigest()
+    on_disk = not _HAS_DIGIT.search(text)
+    cache, lock = _tts_cache()
+    with lock:
+        hit = cache.get(key)
+        if hit is not None:
+            cache.move_to_end(key)
+            return hit
+
+    hit = _read_cached_speech(key) if on_disk else None
+    if hit is None:
+        hit = synthesize_speech(text, lang=lang)
+        # Piper failed and gTTS stood in: don't file that under the Piper key
+        if engine != "gtts" and hit[1] != "audio/wav":
+            return hit
+        if on_disk:
+            _write_cached_speech(key, *hit)
+
+    with lock:
+        cache[key] = hit
+        cache.move_to_end(key)
+        while len(cache) > _TTS_CACHE_MAX:
+            cache.popitem(last=False)
+    return hit
+
 def speak_text_background(text: str, delay: float = 0.12, lang: str = "en"):
     """
-    Robust gTTS playback for Streamlit:
-    - Generates MP3 in-memory
-    - Tries to embed via HTML <audio> with base64 src (gives play controls + often works around autoplay)
-    - Falls back to st.audio if needed
+    Robust TTS playback for Streamlit:
+    - Generates audio in-memory (Piper locally, gTTS as fallback), reusing
+      cached audio for text that was spoken before
+    - Queues playback in the page, so consecutive calls (one per streamed
+      sentence) play one after another instead of on top of each other
+    - Sends the audio once, as a hidden base64 <audio> via components.html
+    - Falls back to st.audio only if components.html fails
     Notes: many browsers block autoplay until user interacts with page.
     """
     try:
         # small UI-friendly delay
         time.sleep(delay)
-        # generate mp3 into BytesIO
-        tts = gTTS(text=text, lang=lang)
-        buf = BytesIO()
-        tts.write_to_fp(buf)
-        buf.seek(0)
-        audio_bytes = buf.read()
+        audio_bytes, mime = cached_speech(text, lang=lang)
 
         # base64 encode for HTML embedding
         b64 = base64.b64encode(audio_bytes).decode("utf-8")
+        audio_id = f"tts-{uuid.uuid4().hex}"
+        # Every components.html call is its own iframe, so the play queue lives
+        # on the parent page (which also survives the iframe being replaced).
         html = f"""
-        <audio controls autoplay>
-            <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
+        <audio id="{audio_id}">
+            <source src="data:{mime};base64,{b64}" type="{mime}">
             Your browser does not support the audio element.
         </audio>
+        <script>
+        (function () {{
+            const src = document.querySelector("#{audio_id} source").src;
+            let host = window;
+            try {{ if (window.parent.Audio) host = window.parent; }} catch (e) {{}}
+            const prev = host.__ttsQueue || Promise.resolve();
+            host.__ttsQueue = prev.then(() => new Promise((done) => {{
+                const a = new host.Audio(src);
+                a.onended = a.onerror = done;
+                a.play().catch(done);
+            }}));
+        }})();
+        </script>
         """
-        # Use components.html so browser receives raw HTML (shows controls)
+        # One delivery only: the audio payload goes over the websocket once
         try:
-            components.html(html, height=80)
-            # also show fallback st.audio (useful if components blocked)
-            try:
-                st.audio(audio_bytes, format="audio/mp3")
-            except Exception as e:
-                print("st.audio fallback error:", e)
+            components.html(html, height=0)
         except Exception as e_html:
             print("components.html error:", e_html)
             # fallback to st.audio only
             try:
-                st.audio(audio_bytes, format="audio/mp3")
+                st.audio(audio_bytes, format=mime)
             except Exception as e2:
                 print("st.audio error after components failed:", e2)
-        finally:
-            try:
-                buf.close()
-            except Exception:
-                pass
 
     except Exception as outer_e:
         # Print full traceback to terminal so you can paste it here if still failing
         print("TTS generation/playback failed:", outer_e)
         traceback.print_exc()
 
+# faster-whisper model size; int8 keeps CPU inference fast and small
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base.en")
+
+@st.cache_resource
+def _whisper_model():
+    """
+    Loads the local Whisper model on first use (not at startup, so cold
+    start stays fast); None if faster-whisper can't be used.
+    """
+    if not WHISPER_AVAILABLE:
+        return None
+    try:
+        return WhisperModel(WHISPER_MODEL, device="cpu", compute_type="int8")
+    except Exception as e:
+        print("Whisper model not loaded, using Google STT:", e)
+        return None
+
+def _recognize(wav_bytes: bytes, asr) -> str:
+    if asr is not None:
+        segments, _ = asr.transcribe(BytesIO(wav_bytes), vad_filter=True)
+        text = " ".join(seg.text.strip() for seg in segments).strip()
+        if not text:
+            raise ValueError("no speech detected")
+        return text
+    return sr.Recognizer().recognize_google(wav_to_audio_data(wav_bytes))
+
+def transcribe(wav_bytes: bytes) -> str:
+    """
+    Speech to text with local faster-whisper, or Google STT when the model
+    isn't available. Recognition runs in AGENT_LOOP's thread pool, and the
+    symbol cache warm-up is started next to it in the background: the
+    transcript is returned as soon as recognition is done, never held back
+    by a slow or failing exchange.
+    """
+    # resolved here, on the script thread, where st.cache_resource belongs
+    asr = _whisper_model()
+
+    async def _run():
+        warm_symbol_list()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _recognize, wav_bytes, asr)
+
+    return submit_async(_run()).result()
+
+def audio_fingerprint(audio_bytes: bytes) -> str:
+    """
+    Cheap hash to spot an already-processed recording. Dedup needs no
+    collision resistance, so use xxh3 if available, else blake2b.
+    """
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64_hexdigest(audio_bytes)
+    return hashlib.blake2b(audio_bytes, digest_size=16).hexdigest()
+
+def wav_to_audio_data(wav_bytes: bytes) -> sr.AudioData:
+    """
+    Builds recognizer input from in-memory WAV bytes, without a temp file.
+    """
+    with wave.open(BytesIO(wav_bytes), "rb") as wf:
+        if wf.getnchannels() == 1:
+            frames = wf.readframes(wf.getnframes())
+            return sr.AudioData(frames, wf.getframerate(), wf.getsampwidth())
+    # multi-channel: let speech_recognition downmix it (still from memory)
+    with sr.AudioFile(BytesIO(wav_bytes)) as source:
+        return sr.Recognizer().record(source)
+
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="Crypto Agent (Push-to-talk)", layout="centered")
 st.title("Crypto Agent — Push-to-talk + Text")
@@ -288,6 +939,8 @@ if "audio_enabled" not in st.session_state:
 if not st.session_state.audio_enabled:
     if st.button("Enable audio / Start demo"):
         st.session_state.audio_enabled = True
+        # load the TTS voice now so the first reply doesn't pay for it
+        _piper_voice()
         st.success("Audio enabled! You can now interact with voice.")
         # force a rerun so the rest of the app shows immediately after click
         st.rerun()
@@ -311,15 +964,13 @@ with st.form(key="input_form", clear_on_submit=True):
     if submit and user_input and user_input.strip():
         val = user_input.strip()
         append_history("You", val)
-        # run agent and show spinner so response text appears immediately
-        with st.spinner("Agent is thinking..."):
-            try:
-                response = run_agent_sync(val)
-            except Exception as e:
-                response = f"Agent error: {e}"
+        # stream the reply so text and speech start with the first sentence
+        try:
+            response = stream_reply(val)
+        except Exception as e:
+            response = f"Agent error: {e}"
+            speak_text_background(response, delay=0.12)
         append_history("Agent", response)
-        # speak slowly (previously slow_factor used) — keep call minimal
-        speak_text_background(response, delay=0.12)
         # NOTE: removed st.rerun() here to avoid interrupting audio playback
 
 # Voice area below
@@ -330,19 +981,12 @@ if not AUDIO_RECORDER_AVAILABLE:
     st.warning("Install `audio-recorder-streamlit` for browser Record/Stop UI. Fallback: upload WAV.")
     upload = st.file_uploader("WAV upload (fallback)", type=["wav"])
     if upload:
-        tmpf = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        tmpf.write(upload.getbuffer())
-        tmpf.close()
-        r = sr.Recognizer()
         try:
-            with sr.AudioFile(tmpf.name) as source:
-                audio = r.record(source)
-            recognized = r.recognize_google(audio)
+            with st.spinner("Transcribing..."):
+                recognized = transcribe(upload.getvalue())
             append_history("You", recognized)
-            with st.spinner("Agent is thinking..."):
-                response = run_agent_sync(recognized)
+            response = stream_reply(recognized)
             append_history("Agent", response)
-            speak_text_background(response, delay=0.12)
             # NOTE: removed st.rerun() here to avoid interrupting audio playback
         except Exception as e:
             st.error("Voice recognition failed: " + str(e))
@@ -351,7 +995,7 @@ else:
 
 if audio_bytes:
     # compute a simple hash to detect repeated same audio
-    current_hash = hashlib.sha256(audio_bytes).hexdigest()
+    current_hash = audio_fingerprint(audio_bytes)
 
     # if we have already processed this exact audio, skip processing
     if st.session_state.get("last_audio_hash") == current_hash:
@@ -361,26 +1005,17 @@ if audio_bytes:
         # mark as processed
         st.session_state["last_audio_hash"] = current_hash
 
-        # save to temp file and transcribe
-        tmpf = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        tmpf.write(audio_bytes)
-        tmpf.close()
-
-        r = sr.Recognizer()
+        # transcribe straight from memory
         try:
-            with sr.AudioFile(tmpf.name) as source:
-                audio = r.record(source)
-            recognized = r.recognize_google(audio)
+            with st.spinner("Transcribing..."):
+                recognized = transcribe(audio_bytes)
 
             # append user text and synchronously call agent
             append_history("You", recognized)
-            with st.spinner("Agent is thinking..."):
-                response = run_agent_sync(recognized)
+            # reply is spoken sentence by sentence while it streams
+            response = stream_reply(recognized)
             append_history("Agent", response)
 
-            # speak in background
-            speak_text_background(response, delay=0.12)
-
             # NOTE: removed st.rerun() here to avoid interrupting audio playback
 
         except Exception as e:
@@ -388,11 +1023,10 @@ if audio_bytes:
 
 # Conversation display
 st.write("### Conversation")
+# One element per message, so an unclosed ``` fence or HTML in one message
+# can't swallow the ones after it.
 for who, txt in st.session_state.history:
-    if who == "You":
-        st.markdown(f"**You:** {txt}")
-    else:
-        st.markdown(f"**Agent:** {txt}")
+    st.markdown(render_turn(who, txt))
 
 st.write("---")
 st.markdown("Tip: Type message and press Enter or Send. For voice, use the browser recorder (Record then Stop).")